@@ -0,0 +1,100 @@
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Utility functions and classes shared by the expected_upstream tools."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from git import Tree
+
+LIBCORE_DIR = Path(__file__).resolve().parents[2]
+EXPECTED_UPSTREAM_PATH = LIBCORE_DIR / 'EXPECTED_UPSTREAM'
+
+
+@dataclass
+class ExpectedUpstreamEntry:
+    """A single entry in the EXPECTED_UPSTREAM file."""
+    dst_path: str  # Destination path in libcore, e.g. ojluni/src/main/java/...
+    git_ref: str  # Upstream git ref, e.g. jdk8u/jdk8u121-b13
+    src_path: str  # Source path within the commit named by git_ref
+
+    def __str__(self):
+        return '%s,%s,%s' % (self.dst_path, self.git_ref, self.src_path)
+
+
+class ExpectedUpstreamFile:
+    """Reads and writes the EXPECTED_UPSTREAM file."""
+
+    def __init__(self, path=EXPECTED_UPSTREAM_PATH):
+        self.path = Path(path)
+
+    def read_all_entries(self) -> List[ExpectedUpstreamEntry]:
+        """Returns all entries in the file, ignoring comments and blanks."""
+        entries = []
+        with open(self.path, 'r') as file:
+            for line_number, line in enumerate(file, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = line.split(',')
+                if len(fields) != 3:
+                    raise ValueError(
+                        '%s:%d: expected 3 comma-separated fields, found %d'
+                        % (self.path, line_number, len(fields)))
+                entries.append(ExpectedUpstreamEntry(*fields))
+        return entries
+
+    def sort_and_write_all_entries(self, entries: List[ExpectedUpstreamEntry]):
+        """Writes the given entries back to the file, sorted by dst_path."""
+        header = []
+        with open(self.path, 'r') as file:
+            for line in file:
+                if not line.strip().startswith('#'):
+                    break
+                header.append(line)
+        with open(self.path, 'w') as file:
+            file.writelines(header)
+            for entry in sorted(entries, key=lambda e: e.dst_path):
+                file.write('%s\n' % entry)
+
+
+def streams_equal(stream_a, stream_b, chunk_size=128 * 1024) -> bool:
+    """Returns True if two binary streams have equal contents.
+
+    Compares chunk by chunk and stops at the first difference, so unequal
+    streams are detected without reading either one fully. Use this when
+    content-addressed SHA comparison is not available, e.g. for files
+    outside the git object database.
+    """
+    while True:
+        chunk_a = stream_a.read(chunk_size)
+        chunk_b = stream_b.read(chunk_size)
+        if chunk_a != chunk_b:
+            return False
+        if not chunk_a:
+            return True
+
+
+def has_file_in_tree(path: str, tree: Tree) -> bool:
+    """Returns True if a file exists at the given path in the tree."""
+    try:
+        tree.join(path)
+        return True
+    except KeyError:
+        return False
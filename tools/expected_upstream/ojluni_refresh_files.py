@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2026 The Android Open Source Project
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Refreshes ojluni files from the upstream refs named in EXPECTED_UPSTREAM.
+
+Reads the EXPECTED_UPSTREAM file, finds the entries whose destination file
+is missing or out of date relative to the named upstream ref, and creates a
+pair of commits for each upstream ref: one importing the upstream content,
+and a second merging that content into the current HEAD.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from collections import defaultdict
+import posixpath
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, TYPE_CHECKING
+
+from common_util import (
+    ExpectedUpstreamEntry,
+    ExpectedUpstreamFile,
+    LIBCORE_DIR,
+)
+
+# GitPython probes for the git binary and loads its submodule tree at
+# import time, which dominates startup in the common nothing-to-do case.
+# It is therefore imported lazily inside the functions that need it.
+if TYPE_CHECKING:
+    from git import Commit, Repo
+
+# SHA-1 of the well-known empty git tree object, present in every
+# repository. Seeding an index from it yields a first commit that contains
+# only the files imported from upstream.
+EMPTY_TREE_SHA = '4b825dc642cb6eb9a060e54bf8d69288fbee4904'
+
+# Blobs larger than this are streamed to disk in COPY_BUFFER_SIZE chunks
+# to bound peak memory; smaller blobs are written with a single read.
+BIG_BLOB_THRESHOLD = 1024 * 1024
+COPY_BUFFER_SIZE = 128 * 1024
+
+THIS_TOOL_PATH = Path(__file__).resolve().relative_to(LIBCORE_DIR)
+
+MSG_FIRST_COMMIT = f"Import %(summary)s from %(ref)s\n\n" \
+                   f"List of files:\n" \
+                   f"  %(files)s\n\n" \
+                   f"Generated by {THIS_TOOL_PATH}\n"
+
+MSG_SECOND_COMMIT = f"Merge %(summary)s from %(ref)s into ojluni\n\n" \
+                    f"List of files:\n" \
+                    f"  %(files)s\n\n" \
+                    f"Generated by {THIS_TOOL_PATH}\n"
+
+
+# Lazily resolved by _empty_tree(); the lookup only needs to happen once
+# even when many entry sets each create their own import commit.
+_EMPTY_TREE = None
+
+# Sentinel meaning "not probed yet"; _load_pygit2() caches the module or
+# None after the first probe.
+_PYGIT2_UNSET = object()
+_pygit2 = _PYGIT2_UNSET
+
+
+def _load_pygit2():
+    """Returns the pygit2 module, or None if it is not installed.
+
+    pygit2 reads blobs in-process through libgit2, avoiding the git
+    cat-file subprocess round-trip that GitPython streaming pays per
+    blob. It is optional; GitPython remains the fallback.
+    """
+    global _pygit2
+    if _pygit2 is _PYGIT2_UNSET:
+        try:
+            import pygit2
+            _pygit2 = pygit2
+        except ImportError:
+            _pygit2 = None
+    return _pygit2
+
+
+def _empty_tree(repo: Repo):
+    """Returns the empty tree object, resolving it on first use only."""
+    global _EMPTY_TREE
+    if _EMPTY_TREE is None:
+        _EMPTY_TREE = repo.tree(EMPTY_TREE_SHA)
+    return _EMPTY_TREE
+
+
+def _tree_lookup(tree, path, subtree_cache):
+    """Returns the object at the given path in the tree.
+
+    Resolves the parent directory through subtree_cache, so looking up
+    many paths in the same directory walks the intermediate trees only
+    once rather than per path. Raises KeyError if the path is missing.
+    """
+    dirname, name = posixpath.split(path)
+    subtree = subtree_cache.get(dirname)
+    if subtree is None:
+        subtree = subtree_cache.setdefault(
+            dirname, tree[dirname] if dirname else tree)
+    return subtree[name]
+
+
+def validate_and_remove_invalid_entries(
+        entries: List[ExpectedUpstreamEntry],
+        repo: Repo) -> List[ExpectedUpstreamEntry]:
+    """Returns the given entries minus any whose upstream file is missing."""
+    from git import BadName, Repo
+
+    thread_locals = threading.local()
+
+    def check_entry(e):
+        # GitPython's object database channel is not thread safe; give
+        # each worker thread its own Repo handle.
+        thread_repo = getattr(thread_locals, 'repo', None)
+        if thread_repo is None:
+            thread_repo = thread_locals.repo = Repo(repo.working_dir)
+        try:
+            commit = thread_repo.commit(e.git_ref)
+            commit.tree.join(e.src_path)
+            return e
+        except (BadName, ValueError, KeyError) as err:
+            logging.warning('Ignoring invalid entry %s: %s', e, err)
+            return None
+
+    # The checks are independent object database reads, so overlap the
+    # subprocess and zlib decompression latency across threads.
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(check_entry, entries))
+    return [e for e in results if e is not None]
+
+
+def _check_refs_resolve(repo: Repo, refs: List[str]) -> None:
+    """Raises ValueError if any of the given refs does not resolve.
+
+    All refs are checked in a single `git cat-file --batch-check`
+    round-trip, so a bad ref fails fast instead of aborting the per-entry
+    loop partway through.
+    """
+    unique_refs = sorted(set(refs))
+    if not unique_refs:
+        return
+    proc = subprocess.Popen(
+        ['git', 'cat-file', '--batch-check'],
+        cwd=repo.working_dir,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE)
+    out, _ = proc.communicate(
+        b''.join(ref.encode() + b'\n' for ref in unique_refs))
+    missing = [ref for ref, line
+               in zip(unique_refs, out.decode().splitlines())
+               if line.endswith(' missing')]
+    if missing:
+        raise ValueError(
+            'Unresolvable upstream refs: %s' % ', '.join(missing))
+
+
+def validate_and_remove_updated_entries(
+        entries: List[ExpectedUpstreamEntry],
+        repo: Repo) -> List[ExpectedUpstreamEntry]:
+    """Returns the entries whose destination file is missing or out of date."""
+    _check_refs_resolve(repo, [e.git_ref for e in entries])
+    head_tree = repo.head.commit.tree
+    # Many entries share the same upstream ref; resolve each ref and its
+    # tree only once instead of re-parsing them per entry.
+    commit_cache: Dict[str, Commit] = {}
+    tree_cache = {}
+    source_subtrees: Dict[str, dict] = {}
+    head_subtrees = {}
+    result = []
+    needs_update = result.append
+    for e in entries:
+        # Bind the entry attributes once per iteration; they are each
+        # read several times below.
+        git_ref = e.git_ref
+        try:
+            commit = commit_cache.get(git_ref)
+            if commit is None:
+                commit = commit_cache.setdefault(
+                    git_ref, repo.commit(git_ref))
+            source_tree = tree_cache.get(git_ref)
+            if source_tree is None:
+                source_tree = tree_cache.setdefault(git_ref, commit.tree)
+            source_blob = _tree_lookup(
+                source_tree, e.src_path,
+                source_subtrees.setdefault(git_ref, {}))
+            try:
+                dst_blob = _tree_lookup(head_tree, e.dst_path, head_subtrees)
+            except KeyError:
+                # The destination file is missing from HEAD.
+                needs_update(e)
+                continue
+            # Blobs are content-addressed, so equal SHAs mean equal
+            # contents; no blob needs to be decompressed at all.
+            if source_blob.binsha != dst_blob.binsha:
+                needs_update(e)
+        except Exception as err:
+            raise ValueError('Failed to validate entry %s' % e) from err
+    return result
+
+
+def partition_entries_by_ref(
+        entries: List[ExpectedUpstreamEntry]
+) -> List[List[ExpectedUpstreamEntry]]:
+    """Partitions the entries into lists sharing the same upstream ref."""
+    result_map = defaultdict(list)
+    for e in entries:
+        result_map[e.git_ref].append(e)
+    return list(result_map.values())
+
+
+def _open_object_db(repo: Repo):
+    """Returns a pygit2.Repository for the same repo, or None.
+
+    When pygit2 is available, blob contents are read in-process and
+    exposed as zero-copy memoryviews instead of being piped through a
+    git cat-file subprocess.
+    """
+    pygit2 = _load_pygit2()
+    if pygit2 is None:
+        return None
+    return pygit2.Repository(repo.working_dir)
+
+
+def _hash_working_tree_files(repo: Repo, paths: List[str]) -> Dict[str, str]:
+    """Returns the blob hexsha of each path that exists in the working tree.
+
+    All files are hashed through a single `git hash-object --stdin-paths`
+    call instead of one subprocess per file.
+    """
+    existing = [p for p in paths if os.path.isfile(p)]
+    if not existing:
+        return {}
+    proc = subprocess.Popen(
+        ['git', 'hash-object', '--stdin-paths'],
+        cwd=repo.working_dir,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE)
+    out, _ = proc.communicate(
+        b''.join(p.encode() + b'\n' for p in existing))
+    if proc.returncode:
+        raise ValueError('git hash-object --stdin-paths exited with %d'
+                         % proc.returncode)
+    return dict(zip(existing, out.decode().split()))
+
+
+def merge_files_and_create_commit(
+        entry_set: List[ExpectedUpstreamEntry], repo: Repo) -> None:
+    """Imports the files in entry_set and merges them into HEAD.
+
+    Creates two commits: the first contains only the files imported from
+    the upstream ref, and the second merges the first commit into the
+    current HEAD. The working tree copies of the files are refreshed to
+    the imported content.
+    """
+    from git import BaseIndexEntry, Blob, IndexFile, Repo
+
+    ref = entry_set[0].git_ref
+    upstream_commit = repo.commit(ref)
+    head_commit = repo.head.commit
+    dst_paths = [entry.dst_path for entry in entry_set]
+    if len(entry_set) == 1:
+        summary = entry_set[0].dst_path
+    else:
+        summary = '%d files' % len(entry_set)
+    # Both commit messages interpolate the same values; compute them once.
+    msg_args = {
+        'summary': summary,
+        'ref': ref,
+        'files': '\n  '.join(dst_paths),
+    }
+
+    # The first commit is based on the empty tree so that it contains
+    # nothing but the imported files.
+    first_index = IndexFile.from_tree(repo, _empty_tree(repo))
+    upstream_tree = upstream_commit.tree
+    upstream_subtrees = {}
+    # A working tree file that already hashes to the upstream blob does
+    # not need to be rewritten, e.g. when only a sibling in the same
+    # entry set was out of date.
+    working_tree_shas = _hash_working_tree_files(repo, dst_paths)
+    working_tree_sha = working_tree_shas.get
+    # Many files share a package directory; create each parent directory
+    # once instead of issuing mkdir syscalls per file.
+    for parent_dir in {str(Path(p).parent) for p in dst_paths}:
+        os.makedirs(parent_dir, exist_ok=True)
+    to_write = []  # (dst_path, binsha, hexsha, size)
+    import_entries = []
+    add_import_entry = import_entries.append
+    for entry in entry_set:
+        # Bind the entry attributes once; they are read several times.
+        dst_path = entry.dst_path
+        src_blob = _tree_lookup(
+            upstream_tree, entry.src_path, upstream_subtrees)
+        if working_tree_sha(dst_path) != src_blob.hexsha:
+            to_write.append(
+                (dst_path, src_blob.binsha, src_blob.hexsha, src_blob.size))
+        # The upstream blob SHA is already authoritative for the file
+        # being written, so the index entry can be built from it without
+        # re-stating or re-hashing the file. The same entries feed all
+        # three index updates below.
+        add_import_entry(BaseIndexEntry.from_blob(
+            Blob(repo, src_blob.binsha, src_blob.mode, dst_path)))
+
+    thread_locals = threading.local()
+
+    def fetch_and_write(item):
+        dst_path, binsha, hexsha, size = item
+        # Each worker writes distinct paths, but neither backend's
+        # object database handle is thread safe, so every thread opens
+        # its own.
+        db = getattr(thread_locals, 'db', None)
+        if db is None:
+            db = thread_locals.db = (
+                _open_object_db(repo) or Repo(repo.working_dir))
+        with open(dst_path, 'wb') as file:
+            if _load_pygit2() is not None:
+                file.write(memoryview(db[hexsha]))
+            elif size > BIG_BLOB_THRESHOLD:
+                shutil.copyfileobj(
+                    db.odb.stream(binsha), file, COPY_BUFFER_SIZE)
+            else:
+                file.write(db.odb.stream(binsha).read())
+
+    # Blob decompression and disk writes for different files are
+    # independent; overlap them across threads.
+    if to_write:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(fetch_and_write, to_write))
+    first_index.add(import_entries)
+    first_commit = first_index.commit(
+        MSG_FIRST_COMMIT % msg_args, parent_commits=[], head=False)
+
+    # The second commit merges the imported files into the current HEAD.
+    # The blobs are already known from the import loop, so there is no
+    # need to re-traverse the first commit's tree to rediscover them.
+    second_index = IndexFile.from_tree(repo, head_commit)
+    second_index.add(import_entries)
+    second_index.commit(
+        MSG_SECOND_COMMIT % msg_args,
+        parent_commits=[head_commit, first_commit],
+        head=True)
+
+    # Resync the stale working index with the new HEAD by adding the
+    # already known index entries in memory, instead of shelling out to
+    # re-read them from the commit tree with reset(paths=...).
+    repo.index.add(import_entries, write=True)
+
+
+def main():
+    from git import Repo
+
+    logging.basicConfig(level=logging.INFO)
+    os.chdir(LIBCORE_DIR)
+    repo = Repo(str(LIBCORE_DIR))
+    try:
+        expected_upstream = ExpectedUpstreamFile()
+        entries = expected_upstream.read_all_entries()
+        entries = validate_and_remove_invalid_entries(entries, repo)
+        entries = validate_and_remove_updated_entries(entries, repo)
+        if not entries:
+            print('All files are up to date.')
+            return
+        entry_sets = partition_entries_by_ref(entries)
+        for entry_set in entry_sets:
+            merge_files_and_create_commit(entry_set, repo)
+    finally:
+        repo.close()
+
+
+if __name__ == '__main__':
+    main()